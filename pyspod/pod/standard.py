@@ -41,21 +41,31 @@ class Standard(Base):
         self._pr0(f'Initialize data ...')
         self._initialize(data_list)
 
-        ## reshape data and remove mean
+        ## reshape data and remove mean in place; the transposed view is
+        ## Fortran-contiguous, as expected by LAPACK, and is not copied
         d = self._data.reshape(self._nt, self._data[0,...].size)
-        d = d - self._t_mean
+        d -= self._t_mean
         d = d.T
 
-        ## eigendecomposition
-        Q = d.conj().T @ (d * self._weights)
-        Q = utils_par.allreduce(Q, comm=self._comm)
-        w, v = scipy.linalg.eig(Q)
+        ## singular value decomposition of the weighted data matrix,
+        ## computed from the R factor of its (distributed) QR decomposition
+        r = utils_par.tsqr_r(d * np.sqrt(self._weights), comm=self._comm)
+        _, s, vh = scipy.linalg.svd(
+            r, full_matrices=False, lapack_driver='gesdd')
+        w = s**2
+        n_modes = min(int(self._n_modes_save), s.size)
+        s = s[:n_modes]
+
+        ## fix the sign of each temporal eigenvector (largest component
+        ## positive)
+        v = vh[:n_modes,:].conj().T
+        v = v * np.sign(v[np.argmax(np.abs(v), axis=0), range(n_modes)])
 
         # bases
         self._pr0(f' ')
         self._pr0(f'Calculating standard POD ...')
         st = time.time()
-        phi = np.real(d @ v) / np.sqrt(w[:])
+        phi = (d @ v) / np.maximum(s, np.finfo(s.dtype).eps)
 
         # truncation and save
         phi_r = phi[:,0:self._n_modes_save]
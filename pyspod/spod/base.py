@@ -77,6 +77,17 @@ class Base():
         self._n_modes_save = params.get('n_modes_save', 1e10)
         # default datatype is double
         self._dtype = params.get('dtype', 'double')
+        # 'mixed' stores Fourier realizations in single precision
+        self._precision = params.get('precision', 'full')
+        # threads per process; one per MPI rank by default, otherwise
+        # the cores available to the process
+        if comm:
+            n_threads = 1
+        elif hasattr(os, 'sched_getaffinity'):
+            n_threads = len(os.sched_getaffinity(0))
+        else:
+            n_threads = os.cpu_count() or 1
+        self._n_threads = int(params.get('n_threads', n_threads))
         # where to save data
         self._savedir = params.get('savedir', os.path.join(CWD,'spod_results'))
         self._savedir = os.path.join(CWD, self._savedir)
@@ -92,6 +103,11 @@ class Base():
         else:
             self._float = np.float32
             self._complex = np.complex64
+        if   self._precision == 'mixed': self._complex_blk = np.complex64
+        elif self._precision == 'full' : self._complex_blk = self._complex
+        else:
+            ## precision not recognized
+            raise ValueError(self._precision, 'not recognized.')
 
         ## define rank and size for both parallel and serial
         if self._comm:
@@ -510,7 +526,7 @@ class Base():
         # get default for confidence interval
         self._xi2_upper = 2 * sc.gammaincinv(self._n_blocks, 1 - self._c_level)
         self._xi2_lower = 2 * sc.gammaincinv(self._n_blocks,     self._c_level)
-        self._eigs_c = np.zeros([self._n_freq,self._n_blocks,2], dtype=complex)
+        self._eigs_c = np.zeros([self._n_freq,self._n_blocks,2], dtype=self._float)
 
         ## create folder to save results
         self._savedir_sim = os.path.join(self._savedir,
@@ -711,8 +727,8 @@ class Base():
 
     def _set_dtype(self, d):
         '''Set data type.'''
-        if   d.dtype == float  : d = d.astype(self._float  )
-        elif d.dtype == complex: d = d.astype(self._complex)
+        if   d.dtype == float  : d = d.astype(self._float  , copy=False)
+        elif d.dtype == complex: d = d.astype(self._complex, copy=False)
         return d
 
 
@@ -724,6 +740,8 @@ class Base():
         self._pr0(f'Problem size (complex)   : {self._pb_size_c[2]:.2f} GB (min {self._pb_size_c[0]:.2f} GB/proc, max {self._pb_size_c[1]:.2f} GB/proc)')
         self._pr0(f'Data type for real       : {self._float}')
         self._pr0(f'Data type for complex    : {self._complex}')
+        self._pr0(f'Data type for FFT blocks : {self._complex_blk}')
+        self._pr0(f'Threads per process      : {self._n_threads}')
         self._pr0(f'No. snapshots per block  : {self._n_dft}')
         self._pr0(f'Block overlap            : {self._n_overlap}')
         self._pr0(f'No. of blocks            : {self._n_blocks}')
@@ -838,12 +856,10 @@ class Base():
         utils_par.pr0(f'Checking if blocks are already present ...', comm)
         all_blocks_exist = 0
         for i_blk in range(0,n_blocks):
-            all_freq_exist = 0
-            for i_freq in range(0,n_freq):
-                tmp_name = f'fft_block{i_blk:08d}_freq{i_freq:08d}.npy'
-                filename = os.path.join(savedir, tmp_name)
-                if os.path.exists(filename): all_freq_exist = all_freq_exist + 1
-            if (all_freq_exist == n_freq):
+            tmp_name = f'fft_block{i_blk:08d}.npy'
+            filename = os.path.join(savedir, tmp_name)
+            if os.path.exists(filename) and \
+                np.load(filename, mmap_mode='r').shape[0] == n_freq:
                 blk = (i_blk + 1) / n_blocks
                 utils_par.pr0(f'block {blk} present in: {savedir}', comm)
                 all_blocks_exist = all_blocks_exist + 1
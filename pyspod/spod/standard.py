@@ -5,9 +5,13 @@ import os
 import sys
 import time
 import math
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from numpy import linalg as la
+import scipy.fft
+import scipy.linalg
+import scipy.linalg.blas
 import scipy.io.matlab as siom
 
 # Import custom Python packages
@@ -17,6 +21,14 @@ try:
     from mpi4py import MPI
 except:
     pass
+try:
+    from threadpoolctl import threadpool_limits
+except:
+    threadpool_limits = None
+try:
+    import pyfftw
+except:
+    pyfftw = None
 
 class Standard(Base):
     '''
@@ -59,73 +71,66 @@ class Standard(Base):
         # loop over number of blocks and generate Fourier realizations,
         # if blocks are not saved in storage
 
+        ## size of the (local) flattened spatial x variable dimension
+        if isinstance(self.data, dict):
+            last_key = list(self.data)[-1]
+            last_val = self.data[last_key]["v"]
+            xvsize = last_val[0,...].size
+        else:
+            xvsize = self.data[0,...].size
+
         ## check if blocks already computed or not
         if blocks_present:
-            # load blocks if present
-            Q_hats = {}
-            size_qhat = [*self._xshape, self._n_blocks]
-            for f in range(self._n_freq):
-                Q_hats[f] = np.empty(size_qhat, dtype=self._complex)
-
+            # load blocks if present (local portion of each block file)
+            idx = utils_par.distribute_dimension(
+                data=np.arange(self._xshape[self._max_axis]),
+                max_axis=0, comm=self._comm)
+            index = [np.s_[:]] * (len(self._xshape) + 1)
+            index[self._max_axis+1] = np.s_[idx[0]:idx[-1]+1]
+            index = tuple(index)
+            size_qhat = [self._n_freq, self._n_blocks, xvsize]
+            Q_hat = np.empty(size_qhat, dtype=self._complex_blk)
             for i_blk in range(0, self._n_blocks):
                 print(f'Loading block {i_blk}/{self._n_blocks}')
-                for i_freq in range(0, self._n_freq):
-                    file = f'fft_block{i_blk:08d}_freq{i_freq:08d}.npy'
-                    path = os.path.join(self._blocks_folder, file)
-                    Q_hats[i_freq][...,i_blk] = np.load(path)
-            for f in range(self._n_freq):
-                Q_hats[f] = utils_par.distribute_dimension(
-                    data=Q_hats[f], max_axis=self._max_axis, comm=self._comm)
-                qhat = Q_hats[f]
-                shape = [qhat[...,0].size, qhat.shape[-1]]
-                Q_hats[f] = np.reshape(Q_hats[f], shape)
+                file = f'fft_block{i_blk:08d}.npy'
+                path = os.path.join(self._blocks_folder, file)
+                Q_blk_hat = np.load(path, mmap_mode='r')[index]
+                Q_hat_blk = Q_hat[:,i_blk,:].reshape(Q_blk_hat.shape)
+                Q_hat_blk[...] = Q_blk_hat
             del self.data
         else:
             # loop over number of blocks and generate Fourier realizations
-            if isinstance(self.data, dict):
-                last_key = list(self.data)[-1]
-                last_val = self.data[last_key]["v"]
-                xvsize = last_val[0,...].size
-            else:
-                xvsize = self.data[0,...].size
-
-            Q_hats = {}
-            for i_blk in range(0,self._n_blocks):
-                st = time.time()
-
-                # compute block
-                qhat = np.empty([self._n_freq, xvsize], dtype=self._complex)
-                qhat[:], offset = self._compute_blocks(i_blk)
-                Q_hats[i_blk] = {}
-                for f in range(self._n_freq):
-                    Q_hats[i_blk][f] = qhat[f,:].copy()
-
-                # save FFT blocks in storage memory
-                if self._savefft == True:
-                    Q_blk_hat = qhat
-                    for i_freq in range(0, self._n_freq):
-                        Q_blk_hat_fr = Q_blk_hat[i_freq,:]
-                        file = f'fft_block{i_blk:08d}_freq{i_freq:08d}.npy'
+            size_qhat = [self._n_freq, self._n_blocks, xvsize]
+            Q_hat = np.empty(size_qhat, dtype=self._complex_blk)
+            self._fft_plan = None
+            ## FFT blocks are saved in the background
+            with _BackgroundSaver(self._comm) as saver:
+                for i_blk in range(0,self._n_blocks):
+                    st = time.time()
+
+                    # compute block
+                    Q_hat[:,i_blk,:], offset = self._compute_blocks(i_blk)
+
+                    # save FFT blocks in storage memory (one file per block)
+                    if self._savefft == True:
+                        file = f'fft_block{i_blk:08d}.npy'
                         path = os.path.join(self._blocks_folder, file)
-                        shape = [*self._xshape]
-                        if self._comm: shape[self._max_axis] = -1
-                        Q_blk_hat_fr.shape = shape
-                        utils_par.npy_save(
-                            self._comm, path, Q_blk_hat_fr,
-                            axis=self._max_axis)
-
-                # print info file
-                self._pr0(f'block {(i_blk+1)}/{(self._n_blocks)}'
-                          f' ({(offset)}:{(self._n_dft+offset)});  '
-                          f'Elapsed time: {time.time() - st} s.')
-
+                        shape = [self._n_freq, *self._xshape]
+                        if self._comm: shape[self._max_axis+1] = -1
+                        Q_blk_hat = Q_hat[:,i_blk,:].reshape(shape)
+                        saver.submit(utils_par.npy_save,
+                            self._comm, path, Q_blk_hat,
+                            axis=self._max_axis+1)
+
+                    # print info file
+                    self._pr0(f'block {(i_blk+1)}/{(self._n_blocks)}'
+                              f' ({(offset)}:{(self._n_dft+offset)});  '
+                              f'Elapsed time: {time.time() - st} s.')
+
+            ## release the FFTW plan and its aligned buffers
+            self._fft_plan = None
             del self.data
 
-            st = time.time()
-            # move from Q_hats[i_blk][f] to Q_hats[f]
-            Q_hats = self._flip_qhat(Q_hats)
-            self._pr0(f'- Time spent transposing Q_hats dictionaries: {time.time() - st} s.')
-
         self._pr0(f'------------------------------------')
         self._pr0(f'Time to compute DFT: {time.time() - start} s.')
         if self._comm: self._comm.Barrier()
@@ -135,11 +140,9 @@ class Standard(Base):
         self._pr0(f' ')
         self._pr0(f'Calculating SPOD (parallel)')
         self._pr0(f'------------------------------------')
-        self._eigs = np.zeros([self._n_freq,self._n_blocks],
-            dtype=self._complex)
 
         ## compute standard spod
-        self._compute_standard_spod(Q_hats)
+        self._compute_standard_spod(Q_hat)
 
         # store and save results
         self._store_and_save()
@@ -162,93 +165,134 @@ class Standard(Base):
 
         Q_blk = self._get_block(offset, offset+self._n_dft)
 
-        # Subtract longtime or provided mean
-        Q_blk -= self._t_mean
-
-        # if block mean is to be subtracted,
+        # Subtract longtime mean or, if block mean is to be subtracted,
         # do it now that all data is collected
-        if self._mean_type.lower() == 'blockwise':
+        if self._mean_type == 'blockwise':
             Q_blk -= np.mean(Q_blk, axis=0)
+        elif self._mean_type == 'longtime':
+            Q_blk -= self._t_mean
 
-        # normalize by pointwise variance
+        # scaling of the spectrum (window gain and pointwise variance)
+        scale = self._win_weight / self._n_dft
         if self._normalize_data:
-            den = self._n_dft - 1
-            Q_var = np.sum((Q_blk - np.mean(Q_blk, axis=0))**2, axis=0) / den
+            Q_var = np.var(Q_blk, axis=0, ddof=1)
             # address division-by-0 problem with NaNs
             Q_var[Q_var < 4 * np.finfo(float).eps] = 1
-            Q_blk /= Q_var
+            scale = scale / Q_var
 
         Q_blk *= self._window
         Q_blk = self._set_dtype(Q_blk)
 
-        if self._isrealx and not self._fullspectrum:
-            Q_blk_hat = (self._win_weight / self._n_dft) * np.fft.rfft(Q_blk, axis=0)
-        else:
-            Q_blk_hat = (self._win_weight / self._n_dft) * np.fft.fft(Q_blk, axis=0)[0:self._n_freq,:]
+        Q_blk_hat = self._fft(Q_blk)
+        Q_blk_hat *= scale
         return Q_blk_hat, offset
 
-    def _compute_standard_spod(self, Q_hats):
+    def _fft(self, Q_blk):
+        '''Temporal FFT of a block (output of FFTW plan is reused).'''
+        one_sided = self._isrealx and not self._fullspectrum
+        if pyfftw is None:
+            if one_sided:
+                return scipy.fft.rfft(Q_blk, axis=0, workers=self._n_threads)
+            return scipy.fft.fft(
+                Q_blk, axis=0, workers=self._n_threads)[0:self._n_freq,:]
+        if self._fft_plan is None:
+            builder = pyfftw.builders.rfft if one_sided \
+                else pyfftw.builders.fft
+            self._fft_plan = builder(
+                pyfftw.empty_aligned(Q_blk.shape, dtype=Q_blk.dtype),
+                axis=0, threads=self._n_threads,
+                planner_effort='FFTW_ESTIMATE')
+        return self._fft_plan(Q_blk)[0:self._n_freq,:]
+
+    def _compute_standard_spod(self, Q_hat):
         '''Compute standard SPOD.'''
 
         comm = self._comm
         # compute inner product in frequency space, for given frequency
+        # (M = A^H A, with A = sqrt(w) Q_hat[f].T, over spatial tiles)
         st = time.time()
-        M = [None]*self._n_freq
+        sqrt_w = np.sqrt(self._weights[:,0])
+        dtype = np.result_type(Q_hat.dtype, sqrt_w.dtype)
+        herk = scipy.linalg.blas.get_blas_funcs('herk', dtype=dtype)
+        n_tile = max(1, 2**21 // (self._n_blocks * dtype.itemsize))
+        M = np.empty([self._n_freq, self._n_blocks, self._n_blocks],
+            dtype=self._complex)
         for f in range(0,self._n_freq):
-            Q_hat_f = np.squeeze(Q_hats[f])
-            M[f] = Q_hat_f.conj().T @ (Q_hat_f * self._weights) / self._n_blocks
-        del Q_hat_f
-        M = np.stack(M)
+            Mf = np.zeros([self._n_blocks, self._n_blocks], dtype, order='F')
+            for x0 in range(0,Q_hat.shape[-1],n_tile):
+                A = Q_hat[f,:,x0:x0+n_tile] * sqrt_w[x0:x0+n_tile]
+                Mf = herk(1. / self._n_blocks, A.T, beta=1., c=Mf,
+                    trans=2, overwrite_c=1)
+            M[f] = Mf + np.triu(Mf, 1).conj().T
         M = utils_par.allreduce(data=M, comm=self._comm)
         self._pr0(f'- M computation: {time.time() - st} s.')
         st = time.time()
 
-        ## compute eigenvalues and eigenvectors
-        L, V = la.eig(M)
-        L = np.real_if_close(L, tol=1000000)
+        ## compute eigenvalues and eigenvectors (closed form for two
+        ## blocks, otherwise concurrently across frequencies)
+        if self._n_blocks == 2:
+            L, V = _eigh_2x2(M.astype(complex))
+            L = L.astype(M.real.dtype, copy=False)
+            V = V.astype(M.dtype, copy=False)
+        else:
+            L = np.empty(M.shape[:2], dtype=M.real.dtype)
+            V = np.empty(M.shape, dtype=M.dtype)
+            def _eigh(f):
+                L[f], V[f] = scipy.linalg.eigh(
+                    M[f].astype(complex), driver='evr', check_finite=False)
+            if threadpool_limits is not None:
+                limits = threadpool_limits(limits=1)
+            else:
+                limits = contextlib.nullcontext()
+            with limits, ThreadPoolExecutor(
+                    max_workers=self._n_threads) as executor:
+                list(executor.map(_eigh, range(self._n_freq)))
         del M
 
-
-        # reorder eigenvalues and eigenvectors
-        ## double non-zero freq and non-Nyquist
-        for f, Lf in enumerate(L):
-            idx = np.argsort(Lf)[::-1]
-            L[f,:] = L[f,idx]
-            vf = V[f,...]
-            vf = vf[:,idx]
-            V[f] = vf
+        # reorder eigenvalues and eigenvectors in descending order, and
+        # fix the phase of each eigenvector (largest component real)
+        L = L[:,::-1]
+        V = V[:,:,::-1]
+        idx = np.argmax(np.abs(V), axis=1)[:,None,:]
+        v_max = np.take_along_axis(V, idx, axis=1)
+        V = V * (v_max.conj() / np.abs(v_max))
         self._pr0(f'- Eig computation: {time.time() - st} s.')
         st = time.time()
 
         # compute spatial modes for given frequency
         L_diag = np.sqrt(self._n_blocks) * np.sqrt(L)
         L_diag_inv = 1. / L_diag
+        V_hat = V[...,0:self._n_modes_save] \
+              * L_diag_inv[:,None,0:self._n_modes_save]
+        V_hat = V_hat.astype(Q_hat.dtype, copy=False)
+        del V
 
         if not self._savefreq_disk2:
-            for f in range(0,self._n_freq):
-                s0 = time.time()
-                ## compute
-                phi = np.matmul(Q_hats[f], V[f,...] * L_diag_inv[f,None,:])
-                phi = phi[...,0:self._n_modes_save]
-                del Q_hats[f]
-
-                sstime = time.time()
-                ## save modes
-                if self._savefreq_disk:
-                    filename = f'freq_idx_{f:08d}.npy'
-                    p_modes = os.path.join(self._modes_dir, filename)
+            ## modes are saved in the background
+            with _BackgroundSaver(comm) as saver:
+                for f in range(0,self._n_freq):
+                    s0 = time.time()
+                    ## compute
+                    phi = np.matmul(Q_hat[f].T, V_hat[f]).astype(
+                        self._complex, copy=False)
 
-                    shape = [*self._xshape,self._nv,self._n_modes_save]
+                    ## save modes
+                    if self._savefreq_disk:
+                        filename = f'freq_idx_{f:08d}.npy'
+                        p_modes = os.path.join(self._modes_dir, filename)
 
-                    if comm:
-                        shape[self._max_axis] = -1
+                        shape = [*self._xshape,self._nv,self._n_modes_save]
 
-                    phi.shape = shape
-                    utils_par.npy_save(self._comm, p_modes, phi, axis=self._max_axis)
+                        if comm:
+                            shape[self._max_axis] = -1
 
-                self._pr0(
-                    f'freq: {f+1}/{self._n_freq};  (f = {self._freq[f]:.5f});  '
-                    f'Elapsed time: {(time.time() - s0):.5f} s.')
+                        phi.shape = shape
+                        saver.submit(utils_par.npy_save,
+                            self._comm, p_modes, phi, axis=self._max_axis)
+
+                    self._pr0(
+                        f'freq: {f+1}/{self._n_freq};  (f = {self._freq[f]:.5f});  '
+                        f'Elapsed time: {(time.time() - s0):.5f} s.')
 
 
         ####################################
@@ -269,8 +313,8 @@ class Standard(Base):
             for f in range(0,self._n_freq):
                 s0 = time.time()
                 phi_dict[f] = {}
-                phi = np.matmul(Q_hats[f], V[f,...] * L_diag_inv[f,None,:])[:,:self._n_modes_save]
-                Q_hats[f] = None
+                phi = np.matmul(Q_hat[f].T, V_hat[f]).astype(
+                    self._complex, copy=False)
                 cum_cctime += time.time() - s0
 
                 s1 = time.time()
@@ -283,8 +327,8 @@ class Standard(Base):
                     f'freq: {f+1}/{self._n_freq};  (f = {self._freq[f]:.5f});  '
                     f'Elapsed time: {(time.time() - s0):.5f} s.')
 
-            del V
-            del Q_hats
+            del V_hat
+            del Q_hat
 
             sstime = time.time()
 
@@ -356,7 +400,8 @@ class Standard(Base):
         if self._isrealx:
             L[1:-1,:] = 2 * L[1:-1,:]
 
-        # get eigenvalues and confidence intervals
+        # get eigenvalues (removing round-off negative values)
+        # and confidence intervals
         self._eigs = np.abs(L)
 
         fac_lower = 2 * self._n_blocks / self._xi2_lower
@@ -406,18 +451,63 @@ class Standard(Base):
             Q_blk = Q_blk.reshape(self._n_dft, self.data[0,...].size)
             return Q_blk
 
-    def _flip_qhat(self, Q_hats):
-        last_blk = list(Q_hats)[-1]
-        last_frq = Q_hats[last_blk]
-        last_val = last_frq[list(last_frq)[-1]]
-        xvsize = last_val.size
 
-        Q_hat_f = {}
+class _BackgroundSaver:
+    '''Run saves in a background thread, if MPI thread support allows.'''
 
-        for f in range(0,self._n_freq):
-            Q_hat_f[f] = np.zeros((xvsize, self._n_blocks),dtype=last_val.dtype)
-            for b,v in Q_hats.items():
-                Q_hat_f[f][:,b] = v[f][:]
-            for b,_ in Q_hats.items():
-                del Q_hats[b][f]
-        return Q_hat_f
+    def __init__(self, comm):
+        self._executor = None
+        if (not comm) or (MPI.Query_thread() >= MPI.THREAD_MULTIPLE):
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._saving = None
+
+    def submit(self, fn, *args, **kwargs):
+        if self._executor is None:
+            fn(*args, **kwargs)
+            return
+        ## wait for the previous save to complete
+        self.wait()
+        self._saving = self._executor.submit(fn, *args, **kwargs)
+
+    def wait(self):
+        if self._saving is not None:
+            saving, self._saving = self._saving, None
+            saving.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+
+def _eigh_2x2(M):
+    '''Closed-form eigendecomposition of 2x2 Hermitian matrices.'''
+    a = M[:,0,0].real
+    d = M[:,1,1].real
+    b = M[:,0,1]
+    h = (a - d) / 2
+    r = np.hypot(h, np.abs(b))
+    L = np.stack([(a + d) / 2 - r, (a + d) / 2 + r], axis=1)
+
+    ## eigenvector of the largest eigenvalue, from the best conditioned
+    ## row of M - L I
+    x = np.where(h >= 0, r + h, b)
+    y = np.where(h >= 0, b.conj(), r - h)
+    n = np.hypot(np.abs(x), np.abs(y))
+    zero = n == 0
+    n[zero] = 1
+    x = np.where(zero, 1, x / n)
+    y = np.where(zero, 0, y / n)
+
+    ## the other eigenvector is its orthogonal complement
+    V = np.empty(M.shape, dtype=M.dtype)
+    V[:,0,0] = -y.conj()
+    V[:,1,0] =  x.conj()
+    V[:,0,1] =  x
+    V[:,1,1] =  y
+    return L, V
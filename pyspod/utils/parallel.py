@@ -170,6 +170,34 @@ def allreduce(data, comm):
     return data_reduced
 
 
+def tsqr_r(data, comm):
+    """
+    R factor of the QR decomposition of a tall-skinny matrix
+    distributed by rows, computed via a binary-tree TSQR reduction.
+    """
+    n = data.shape[1]
+    r = np.linalg.qr(data, mode='r')
+    if comm is not None:
+        ## pad to n x n (zero rows leave R^H R unchanged)
+        r_pad = np.zeros([n, n], dtype=r.dtype)
+        r_pad[:r.shape[0]] = r
+        r = r_pad
+        r_recv = np.empty_like(r)
+        rank, size = comm.rank, comm.size
+        step = 1
+        while step < size:
+            if rank % (2 * step) == step:
+                comm.Send(r, dest=rank-step)
+                break
+            if rank + step < size:
+                comm.Recv(r_recv, source=rank+step)
+                r = np.ascontiguousarray(
+                    np.linalg.qr(np.vstack([r, r_recv]), mode='r'))
+            step *= 2
+        comm.Bcast(r, root=0)
+    return r
+
+
 def barrier(comm):
     if comm is not None:
         comm.Barrier()
@@ -77,6 +77,7 @@ def test_standard_class_compute():
     # print(np.min(np.abs(modes)))
     # print(np.max(np.abs(modes)))
     assert(modes.shape==(20, 88, 1, 8))
+    assert(pod.eigs.shape==(1000,))
     assert((np.real(pod.eigs[0])    <5.507017010287017  +tol1) and \
            (np.real(pod.eigs[0])    >5.507017010287017  -tol1))
     assert((pod.weights[0,0]        <1.                 +tol1) and \
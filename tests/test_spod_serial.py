@@ -14,6 +14,7 @@ sys.path.append(os.path.join(CFD,'../'))
 
 # Import library specific modules
 from pyspod.spod.standard  import Standard  as spod_standard
+import pyspod.spod.standard  as spod_standard_module
 from pyspod.spod.streaming import Streaming as spod_streaming
 import pyspod.spod.utils     as utils_spod
 import pyspod.utils.weights  as utils_weights
@@ -110,6 +111,120 @@ def test_standard_reuse_blocks():
     except OSError as e:
         pass
 
+def test_standard_mixed_precision():
+    ## -------------------------------------------------------------------
+    data_file = os.path.join(CFD,'./data', 'fluidmechanics_data.mat')
+    data_dict = utils_io.read_data(data_file=data_file)
+    data = data_dict['p'].T
+    dt = data_dict['dt'][0,0]
+    nt = data.shape[0]
+    config_file = os.path.join(CFD, 'data', 'input_spod.yaml')
+    params = utils_io.read_config(config_file)
+    params['time_step'] = dt
+    params['fullspectrum'] = True
+    ## -------------------------------------------------------------------
+    spod_class = spod_standard(params=params)
+    spod = spod_class.fit(data_list=data)
+    T_ = 12.5;     tol = 1e-6
+    f_, f_idx = spod.find_nearest_freq(freq_req=1/T_, freq=spod.freq)
+    eigs = spod.eigs.copy()
+    modes = spod.get_modes_at_freq(freq_idx=f_idx)
+    ## store Fourier realizations in single precision
+    params['precision'] = 'mixed'
+    spod_class = spod_standard(params=params)
+    spod = spod_class.fit(data_list=data)
+    modes_mixed = spod.get_modes_at_freq(freq_idx=f_idx)
+    assert(modes_mixed.dtype == np.complex128)
+    assert(np.max(np.abs(spod.eigs - eigs)) < tol * np.max(eigs))
+    assert(np.max(np.abs(np.abs(modes_mixed) - np.abs(modes))) < tol)
+    ## unknown precision
+    params['precision'] = 'single'
+    try:
+        spod_class = spod_standard(params=params)
+        assert(False)
+    except ValueError:
+        pass
+    try:
+        shutil.rmtree(os.path.join(CWD, params['savedir']))
+    except OSError as e:
+        pass
+
+def test_standard_two_blocks():
+    ## -------------------------------------------------------------------
+    data_file = os.path.join(CFD,'./data', 'fluidmechanics_data.mat')
+    data_dict = utils_io.read_data(data_file=data_file)
+    data = data_dict['p'].T[:96]
+    dt = data_dict['dt'][0,0]
+    nt = data.shape[0]
+    config_file = os.path.join(CFD, 'data', 'input_spod.yaml')
+    params = utils_io.read_config(config_file)
+    params['time_step'] = dt
+    params['fullspectrum'] = True
+    ## -------------------------------------------------------------------
+    spod_class = spod_standard(params=params)
+    spod = spod_class.fit(data_list=data)
+    assert(spod.n_blocks == 2)
+    T_ = 12.5;     tol = 1e-10
+    f_, f_idx = spod.find_nearest_freq(freq_req=1/T_, freq=spod.freq)
+    modes_at_freq = spod.get_modes_at_freq(freq_idx=f_idx)
+    assert((spod.eigs[f_idx,0]               <0.01009500704851886+tol) and \
+           (spod.eigs[f_idx,0]               >0.01009500704851886-tol))
+    assert((spod.eigs[f_idx,1]               <0.00218549298830385+tol) and \
+           (spod.eigs[f_idx,1]               >0.00218549298830385-tol))
+    assert((np.abs(modes_at_freq[0,1,0,0])  <0.00148235982390613+tol) and \
+           (np.abs(modes_at_freq[0,1,0,0])  >0.00148235982390613-tol))
+    assert((np.abs(modes_at_freq[10,3,0,1]) <0.00044585687603720+tol) and \
+           (np.abs(modes_at_freq[10,3,0,1]) >0.00044585687603720-tol))
+    assert((np.min(np.abs(modes_at_freq))   <2.7093281639043e-05+tol) and \
+           (np.min(np.abs(modes_at_freq))   >2.7093281639043e-05-tol))
+    assert((np.max(np.abs(modes_at_freq))   <0.19698612101073612+tol) and \
+           (np.max(np.abs(modes_at_freq))   >0.19698612101073612-tol))
+    ## single precision is kept with the closed-form solver
+    params['dtype'] = 'single'
+    spod_class = spod_standard(params=params)
+    spod = spod_class.fit(data_list=data)
+    assert(spod.eigs.dtype == np.float32)
+    try:
+        shutil.rmtree(os.path.join(CWD, params['savedir']))
+    except OSError as e:
+        pass
+
+def test_standard_fft_backends():
+    ## -------------------------------------------------------------------
+    data_file = os.path.join(CFD,'./data', 'fluidmechanics_data.mat')
+    data_dict = utils_io.read_data(data_file=data_file)
+    data = data_dict['p'].T
+    dt = data_dict['dt'][0,0]
+    nt = data.shape[0]
+    config_file = os.path.join(CFD, 'data', 'input_spod.yaml')
+    params = utils_io.read_config(config_file)
+    params['time_step'] = dt
+    params['fullspectrum'] = True
+    ## -------------------------------------------------------------------
+    pyfftw = spod_standard_module.pyfftw
+    if pyfftw is None: return
+    tol = 1e-10
+    for fullspectrum in [True, False]:
+        params['fullspectrum'] = fullspectrum
+        spod_class = spod_standard(params=params)
+        spod = spod_class.fit(data_list=data)
+        eigs = spod.eigs.copy()
+        modes = spod.get_modes_at_freq(freq_idx=5)
+        ## same decomposition with scipy.fft
+        try:
+            spod_standard_module.pyfftw = None
+            spod_class = spod_standard(params=params)
+            spod = spod_class.fit(data_list=data)
+        finally:
+            spod_standard_module.pyfftw = pyfftw
+        modes_sp = spod.get_modes_at_freq(freq_idx=5)
+        assert(np.max(np.abs(spod.eigs - eigs)) < tol)
+        assert(np.max(np.abs(np.abs(modes_sp) - np.abs(modes))) < tol)
+    try:
+        shutil.rmtree(os.path.join(CWD, params['savedir']))
+    except OSError as e:
+        pass
+
 def test_standard_svd():
     ## -------------------------------------------------------------------
     data_file = os.path.join(CFD,'./data', 'fluidmechanics_data.mat')
@@ -537,6 +652,9 @@ def test_streaming_freq():
 if __name__ == "__main__":
     test_standard_fullspectrum()
     test_standard_reuse_blocks()
+    test_standard_mixed_precision()
+    test_standard_two_blocks()
+    test_standard_fft_backends()
     test_standard_svd()
     test_standard_inv()
     test_standard_freq_class_compute()
@@ -122,6 +122,32 @@ def test_parallel_allreduce():
         assert((np.sum(dts_r)<35009021572.78676+tol) and \
                (np.sum(dts_r)>35009021572.78676-tol))
 
+@pytest.mark.mpi(minsize=2, maxsize=2)
+def test_parallel_tsqr_r():
+    try:
+        from mpi4py import MPI
+        comm = MPI.COMM_WORLD
+    except:
+        comm = None
+    rank = comm.rank
+    ## ------------------------------------------------------------------------
+    ## rank 0 holds more rows than columns, all other ranks fewer
+    n = 8
+    counts = [n + 10] + [3] * (comm.size - 1)
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal([sum(counts), n]) \
+         + rng.standard_normal([sum(counts), n]) * 1j
+    start = sum(counts[:rank])
+    data_local = data[start:start+counts[rank]]
+    ## ------------------------------------------------------------------------
+    r_s = utils_par.tsqr_r(data, comm=None)
+    r_p = utils_par.tsqr_r(data_local, comm=comm)
+    gram = data.conj().T @ data
+    tol = 1e-10
+    assert(r_p.shape==(n, n))
+    assert(np.allclose(r_s.conj().T @ r_s, gram, atol=tol, rtol=0))
+    assert(np.allclose(r_p.conj().T @ r_p, gram, atol=tol, rtol=0))
+
 @pytest.mark.mpi(minsize=2, maxsize=2)
 def test_parallel_pr0():
     try:
@@ -297,6 +323,7 @@ if __name__ == "__main__":
     test_parallel_pvar()
     test_parallel_distribute()
     test_parallel_allreduce()
+    test_parallel_tsqr_r()
     test_parallel_pr0()
     test_parallel_distribute_2phase()
     test_parallel_distribute_2phase_chunks()